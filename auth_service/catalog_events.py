@@ -0,0 +1,163 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import select
+import threading
+from typing import List, Optional, Set, Tuple
+from sqlalchemy import func, text, update
+from sqlalchemy.orm import Session
+from database import engine, SessionLocal
+from models import Tour, CatalogChange
+
+CHANNEL = "catalog_changes"
+LISTEN_POLL_SECONDS = 5
+RECONNECT_DELAY_SECONDS = 3
+SUBSCRIBER_QUEUE_SIZE = 1000
+# Догонка при переподключении не длиннее REPLAY_LIMIT событий, иначе клиенту отправляется reset
+REPLAY_LIMIT = int(os.getenv("CATALOG_REPLAY_LIMIT", "1000"))
+# Журнал хранится RETENTION_DAYS дней; очистка запускается примерно раз в PRUNE_EVERY изменений
+RETENTION_DAYS = int(os.getenv("CATALOG_CHANGES_RETENTION_DAYS", "7"))
+PRUNE_EVERY = int(os.getenv("CATALOG_CHANGES_PRUNE_EVERY", "200"))
+
+logger = logging.getLogger("catalog")
+
+
+def record_catalog_change(db: Session, tour: Tour, op: str) -> CatalogChange:
+    """Повышает версию тура и пишет событие в журнал + NOTIFY.
+
+    Вызывается до db.commit(): NOTIFY доставляется слушателям только после коммита
+    транзакции, так что откатившееся изменение в ленту не попадёт.
+    """
+    version = tour.version or 1
+    if op != "create":
+        # Инкремент в SQL: строка тура блокируется до коммита, параллельные изменения получают разные версии
+        version = db.execute(
+            update(Tour).where(Tour.id == tour.id).values(version=Tour.version + 1).returning(Tour.version)
+        ).scalar_one()
+    change = CatalogChange(tour_id=tour.id, version=version, op=op)
+    db.add(change)
+    db.flush()
+    db.execute(text("SELECT pg_notify(:channel, :payload)"),
+               {"channel": CHANNEL, "payload": json.dumps(change_to_dict(change))})
+    if random.randrange(PRUNE_EVERY) == 0:
+        prune_catalog_changes(db)
+    return change
+
+
+def prune_catalog_changes(db: Session):
+    """Удаляет события старше срока хранения; клиенты с более старым Last-Event-ID получат reset"""
+    db.execute(text("DELETE FROM catalog_changes WHERE created_at < now() - make_interval(days => :days)"),
+               {"days": RETENTION_DAYS})
+
+
+def load_changes_since(last_id: int) -> Tuple[List[dict], Optional[int]]:
+    """Догоняющая часть при переподключении клиента.
+
+    Возвращает (события после last_id, None) либо ([], id последнего события), если
+    last_id старше хранимого журнала или пропущено больше REPLAY_LIMIT событий —
+    тогда клиенту нужно заново загрузить каталог целиком.
+    """
+    db = SessionLocal()
+    try:
+        oldest_id, latest_id = db.query(func.min(CatalogChange.id), func.max(CatalogChange.id)).one()
+        if latest_id is None or last_id >= latest_id:
+            return [], None
+        if last_id < oldest_id - 1:
+            return [], latest_id
+
+        changes = (
+            db.query(CatalogChange)
+            .filter(CatalogChange.id > last_id)
+            .order_by(CatalogChange.id)
+            .limit(REPLAY_LIMIT + 1)
+            .all()
+        )
+        if len(changes) > REPLAY_LIMIT:
+            return [], latest_id
+        return [change_to_dict(change) for change in changes], None
+    finally:
+        db.close()
+
+
+def change_to_dict(change: CatalogChange) -> dict:
+    return {"id": change.id, "tour_id": change.tour_id, "version": change.version, "op": change.op}
+
+
+def format_sse(change: dict) -> str:
+    return f"id: {change['id']}\nevent: tour\ndata: {json.dumps(change)}\n\n"
+
+
+def format_reset_sse(latest_id: int) -> str:
+    # id сдвигает Last-Event-ID клиента, чтобы следующее переподключение не повторило reset
+    return f"id: {latest_id}\nevent: reset\ndata: {json.dumps({'latest_id': latest_id})}\n\n"
+
+
+class CatalogChangeBroker:
+    """Один LISTEN-поток на процесс, раздающий NOTIFY всем SSE-подписчикам этого процесса"""
+
+    def __init__(self):
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._connected_once = False
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(queue)
+            if self._thread is None:
+                self._loop = asyncio.get_running_loop()
+                self._thread = threading.Thread(target=self._listen_forever, name="catalog-listener", daemon=True)
+                self._thread.start()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers.discard(queue)
+
+    def _publish(self, change: dict):
+        # Выполняется в event loop; медленный клиент теряет события и переподключится по Last-Event-ID.
+        # Словарь {"reset_to": id} вместо события — NOTIFY могли потеряться, подписчикам нужен reset
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(change)
+            except asyncio.QueueFull:
+                pass
+
+    def _listen_forever(self):
+        while True:
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("LISTEN прерван, переподключение")
+            threading.Event().wait(RECONNECT_DELAY_SECONDS)
+
+    def _listen(self):
+        # Отдельное соединение, выведенное из пула: оно занято LISTEN на всё время жизни процесса
+        raw = engine.raw_connection()
+        conn = raw.driver_connection
+        raw.detach()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+                if self._connected_once:
+                    # Пока LISTEN не работал, уведомления не доставлялись — догнать их из очереди нельзя
+                    cursor.execute("SELECT coalesce(max(id), 0) FROM catalog_changes")
+                    self._loop.call_soon_threadsafe(self._publish, {"reset_to": cursor.fetchone()[0]})
+                self._connected_once = True
+            while True:
+                if select.select([conn], [], [], LISTEN_POLL_SECONDS) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    self._loop.call_soon_threadsafe(self._publish, json.loads(notify.payload))
+        finally:
+            conn.close()
+
+
+broker = CatalogChangeBroker()
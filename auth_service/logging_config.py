@@ -0,0 +1,197 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Одинаковые ошибки валидации (тот же путь и те же поля) пишутся не чаще N раз за окно
+VALIDATION_LOG_WINDOW_SECONDS = float(os.getenv("VALIDATION_LOG_WINDOW_SECONDS", "60"))
+VALIDATION_LOG_MAX_PER_WINDOW = int(os.getenv("VALIDATION_LOG_MAX_PER_WINDOW", "5"))
+REQUEST_ID_HEADER = "x-request-id"
+
+# id текущего запроса — попадает во все записи, включая access-лог uvicorn
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Выполняется в потоке вызывающего кода, пока контекст запроса ещё доступен
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который при переполненной очереди отбрасывает запись, а не блокирует event loop"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # В потоке вызывающего кода только подставляем args; JSON собирает фоновый писатель
+        record = copy.copy(record)
+        # Access-лог uvicorn: args = (client, method, path, http_version, status)
+        if record.name == "uvicorn.access" and isinstance(record.args, tuple) and len(record.args) == 5:
+            client, method, path, _, status_code = record.args
+            record.fields = {"client": client, "method": method, "path": path, "status": status_code}
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging():
+    """Корневой логгер пишет в очередь; в stdout пишет отдельный фоновый поток"""
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+
+    # Логи uvicorn (включая access) идут через ту же очередь
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+class LogSampler:
+    """Не более max_per_window записей на ключ за окно; остальные только считаются"""
+
+    def __init__(self, window_seconds: float = 60.0, max_per_window: int = 5, max_keys: int = 10_000):
+        self.window = window_seconds
+        self.max_per_window = max_per_window
+        self.max_keys = max_keys
+        self._windows: dict = {}
+        self._lock = threading.Lock()
+
+    def should_log(self, key) -> Tuple[bool, int]:
+        """Возвращает (писать ли запись, сколько записей по ключу подавлено с прошлого раза)"""
+        now = time.monotonic()
+        with self._lock:
+            if key not in self._windows and len(self._windows) >= self.max_keys:
+                self._windows.clear()
+            started, logged, suppressed = self._windows.get(key, (now, 0, 0))
+            if now - started >= self.window:
+                started, logged = now, 0
+            if logged < self.max_per_window:
+                self._windows[key] = (started, logged + 1, 0)
+                return True, suppressed
+            self._windows[key] = (started, logged, suppressed + 1)
+            return False, 0
+
+
+validation_logger = logging.getLogger("app.validation")
+validation_sampler = LogSampler(VALIDATION_LOG_WINDOW_SECONDS, VALIDATION_LOG_MAX_PER_WINDOW)
+
+
+def log_validation_error(method: str, path: str, errors: list):
+    """Пишет ошибку валидации 422 с сэмплированием повторов; значения полей (input) не логируются"""
+    details = [{"loc": list(err.get("loc", ())), "type": err.get("type"), "msg": err.get("msg")} for err in errors]
+    key = (method, path, tuple((tuple(d["loc"]), d["type"]) for d in details))
+    should_log, suppressed = validation_sampler.should_log(key)
+    if not should_log:
+        return
+    validation_logger.warning("Ошибка валидации запроса", extra={"fields": {
+        "method": method,
+        "path": path,
+        "errors": details,
+        "suppressed_since_last": suppressed,
+    }})
+
+
+class RequestIdMiddleware:
+    """ASGI-обёртка приложения: берёт X-Request-ID клиента/прокси или генерирует новый и возвращает его в ответе.
+
+    Подключается через add_request_id_middleware, а не add_middleware, иначе оказалась бы
+    внутри ServerErrorMiddleware.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == REQUEST_ID_HEADER.encode():
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        # Без reset: uvicorn обрабатывает каждый запрос в отдельной задаче со своей копией контекста,
+        # а трассировку необработанного исключения и access-строку пишет уже после выхода из приложения
+        request_id_var.set(request_id)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((REQUEST_ID_HEADER.encode(), request_id.encode()))
+                message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_request_id)
+
+
+def add_request_id_middleware(app):
+    """Ставит RequestIdMiddleware самым внешним слоем стека, снаружи ServerErrorMiddleware.
+
+    Само приложение остаётся объектом FastAPI, поэтому uvicorn main:app и fastapi-cli находят его как обычно.
+    """
+    build_middleware_stack = app.build_middleware_stack
+    app.build_middleware_stack = lambda: RequestIdMiddleware(build_middleware_stack())
@@ -1,16 +1,23 @@
 from fastapi.middleware.cors import CORSMiddleware
-from database import engine, Base
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
-import json
 import routes
+from logging_config import setup_logging, log_validation_error, add_request_id_middleware
+from media import start_image_pool, shutdown_image_pool
+from migrations import run_migrations
 
-# Создаём таблицы в БД (если их нет)
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+# Логирование и DDL — в хуке запуска, а не при импорте: процессы пула изображений (spawn)
+# заново импортируют запускаемый скрипт, и эти шаги не должны выполняться в каждом из них
+def init_app():
+    setup_logging()
+    # Создаём таблицы в БД (если их нет) и применяем изменения схемы
+    run_migrations()
+
+
+app = FastAPI(on_startup=[init_app, start_image_pool], on_shutdown=[shutdown_image_pool])
 
 # Настройки CORS
 app.add_middleware(
@@ -30,10 +37,8 @@ async def request_validation_exception_handler(request: Request, exc: RequestVal
         error_message = f"Ошибка в поле '{field_path}': {err['msg']}"
         error_details.append(error_message)
 
-    # Выводим в консоль в более удобочитаемом формате
-    print("❌ Ошибка валидации запроса:")
-    for error in error_details:
-        print(f"  - {error}")
+    # Неблокирующий структурированный лог (через очередь, с сэмплированием повторов)
+    log_validation_error(request.method, request.url.path, exc.errors())
 
     return JSONResponse(
         status_code=422,
@@ -44,7 +49,11 @@ async def request_validation_exception_handler(request: Request, exc: RequestVal
 # Подключаем маршруты
 app.include_router(routes.router)
 
+# Request id — самый внешний слой: снаружи ServerErrorMiddleware, чтобы ответ 500
+# тоже получал X-Request-ID, а трассировка и access-лог 500 были с тем же id
+add_request_id_middleware(app)
+
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host="127.0.0.1", port=8222)
+    uvicorn.run(app, host="127.0.0.1", port=8222, log_config=None)
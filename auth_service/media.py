@@ -0,0 +1,162 @@
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import re
+import tempfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional
+from PIL import Image
+
+MEDIA_DIR = os.getenv("MEDIA_DIR", "media")
+SCHEDULE_IMAGES_DIR = os.path.join(MEDIA_DIR, "schedules")
+SCHEDULE_IMAGES_URL = "/media/schedules"
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_IMAGE_UPLOAD_BYTES", str(15 * 1024 * 1024)))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+# Ширина варианта в пикселях; все варианты кодируются в WebP
+VARIANTS = {"thumb": 320, "medium": 1024}
+WEBP_QUALITY = 80
+
+FORMAT_EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "gif"}
+
+# Имена файлов: sha256 содержимого + необязательный суффикс варианта
+MEDIA_NAME_RE = re.compile(r"^(?P<digest>[0-9a-f]{64})(?:_(?P<variant>%s))?\.(?P<ext>jpg|png|webp|gif)$"
+                           % "|".join(VARIANTS))
+
+logger = logging.getLogger("media")
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def start_image_pool():
+    """Создаёт пул при старте приложения.
+
+    Контекст spawn: fork процесса, где уже работают потоки LISTEN и логирования,
+    может оставить дочерний процесс с навсегда захваченной блокировкой.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+
+def shutdown_image_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _write_atomic(path: str, write):
+    """Пишет через уникальный временный файл в том же каталоге и атомарно переименовывает"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _variants_missing(digest: str) -> bool:
+    return any(not os.path.exists(os.path.join(SCHEDULE_IMAGES_DIR, variant_name(digest, variant)))
+               for variant in VARIANTS)
+
+
+def _log_variant_failure(digest: str, future: Future):
+    if future.cancelled():
+        return
+    exc = future.exception()
+    if exc is not None:
+        logger.error("Не удалось построить варианты изображения", exc_info=exc,
+                     extra={"fields": {"digest": digest}})
+
+
+def _schedule_variants(path: str, digest: str):
+    if _executor is None:
+        raise RuntimeError("Image pool is not started")
+    future = _executor.submit(generate_variants, path, digest)
+    future.add_done_callback(lambda f: _log_variant_failure(digest, f))
+
+
+def variant_name(digest: str, variant: str) -> str:
+    return f"{digest}_{variant}.webp"
+
+
+def save_schedule_image(data: bytes) -> str:
+    """Сохраняет оригинал под именем sha256.<ext> и ставит варианты в очередь; возвращает URL оригинала"""
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise ValueError("Image is too large")
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image_format = image.format
+            image.verify()
+    except Exception:
+        raise ValueError("File is not a valid image")
+    if image_format not in FORMAT_EXTENSIONS:
+        raise ValueError(f"Unsupported image format: {image_format}")
+
+    digest = hashlib.sha256(data).hexdigest()
+    name = f"{digest}.{FORMAT_EXTENSIONS[image_format]}"
+    path = os.path.join(SCHEDULE_IMAGES_DIR, name)
+
+    # Одинаковое содержимое — одно имя: повторная загрузка не пишет файл заново,
+    # но ставит варианты в очередь, если прошлая генерация не удалась
+    if not os.path.exists(path):
+        os.makedirs(SCHEDULE_IMAGES_DIR, exist_ok=True)
+        _write_atomic(path, lambda f: f.write(data))
+    if _variants_missing(digest):
+        _schedule_variants(path, digest)
+
+    return f"{SCHEDULE_IMAGES_URL}/{name}"
+
+
+def generate_variants(path: str, digest: str):
+    """Выполняется в пуле процессов: уменьшенные WebP-копии оригинала"""
+    with Image.open(path) as image:
+        image.load()
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        for variant, width in VARIANTS.items():
+            target = os.path.join(SCHEDULE_IMAGES_DIR, variant_name(digest, variant))
+            if os.path.exists(target):
+                continue
+            resized = image.copy()
+            resized.thumbnail((width, width * 4))
+            _write_atomic(target, lambda f: resized.save(f, "WEBP", quality=WEBP_QUALITY, method=4))
+
+
+def image_variant_urls(image_url: Optional[str]) -> Optional[dict]:
+    """URL вариантов для локально сохранённых изображений; для внешних ссылок — None"""
+    if not image_url or not image_url.startswith(SCHEDULE_IMAGES_URL + "/"):
+        return None
+    match = MEDIA_NAME_RE.match(image_url.rsplit("/", 1)[-1])
+    if not match or match.group("variant"):
+        return None
+    digest = match.group("digest")
+    urls = {variant: f"{SCHEDULE_IMAGES_URL}/{variant_name(digest, variant)}" for variant in VARIANTS}
+    urls["original"] = image_url
+    return urls
+
+
+def resolve_media_path(name: str) -> Optional[tuple[str, bool]]:
+    """Путь к файлу для отдачи и признак того, что это запрошенный файл (а не запасной оригинал)"""
+    match = MEDIA_NAME_RE.match(name)
+    if not match:
+        return None
+    path = os.path.join(SCHEDULE_IMAGES_DIR, name)
+    if os.path.exists(path):
+        return path, True
+    if not match.group("variant"):
+        return None
+
+    # Вариант ещё не готов — временно отдаём оригинал
+    digest = match.group("digest")
+    for ext in FORMAT_EXTENSIONS.values():
+        original = os.path.join(SCHEDULE_IMAGES_DIR, f"{digest}.{ext}")
+        if os.path.exists(original):
+            return original, False
+    return None
@@ -0,0 +1,132 @@
+import logging
+import time
+from contextlib import contextmanager
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from database import SessionLocal, Base, engine
+from models import Tour, TourDeparture, SchemaMigration
+from utils import parse_departure_date
+from logging_config import setup_logging
+
+logger = logging.getLogger("migrations")
+
+# Ключ pg_advisory_lock: миграции одновременно выполняет только один процесс
+MIGRATIONS_LOCK_ID = 0x6361745F6D6967  # "cat_mig"
+LOCK_POLL_SECONDS = 0.5
+
+
+@contextmanager
+def migrations_lock(conn: Connection):
+    """Сессионная advisory-блокировка на время DDL.
+
+    Ждём через pg_try_advisory_lock, а не блокирующий pg_advisory_lock: CREATE INDEX
+    CONCURRENTLY ждёт завершения чужих запросов, и висящий в ожидании блокировки
+    SELECT другого воркера превратился бы во взаимную блокировку.
+    """
+    while not conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": MIGRATIONS_LOCK_ID}).scalar():
+        time.sleep(LOCK_POLL_SECONDS)
+    try:
+        yield
+    finally:
+        conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATIONS_LOCK_ID})
+
+
+def add_missing_columns(conn: Connection):
+    """Колонки, добавленные в уже существующие таблицы после первого create_all"""
+    conn.execute(text("ALTER TABLE tours ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1"))
+
+
+def remove_duplicate_departures(conn: Connection):
+    """Дубли (tour_id, date) могли появиться до уникального индекса — оставляем самую раннюю строку"""
+    conn.execute(text("""
+        DELETE FROM tour_departures a
+        USING tour_departures b
+        WHERE a.tour_id = b.tour_id AND a.date = b.date AND a.id > b.id
+    """))
+
+
+def create_missing_indexes(conn: Connection):
+    """create_all не добавляет индексы в уже существующие таблицы — создаём их отдельно.
+
+    CONCURRENTLY не блокирует запись в таблицу; прерванная такая сборка оставляет
+    невалидный индекс, который IF NOT EXISTS пропустил бы, поэтому его пересоздаём.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            valid = conn.execute(text("""
+                SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE c.relname = :name
+            """), {"name": index.name}).scalar()
+            if valid:
+                continue
+            if valid is False:
+                conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'))
+            index.dialect_options["postgresql"]["concurrently"] = True
+            try:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+            finally:
+                index.dialect_options["postgresql"]["concurrently"] = False
+
+
+def run_once(name: str, step):
+    """Выполняет шаг один раз за всё время жизни БД; отметка пишется в той же транзакции"""
+    db = SessionLocal()
+    try:
+        if db.query(SchemaMigration).filter(SchemaMigration.name == name).first():
+            return
+        step(db)
+        db.add(SchemaMigration(name=name))
+        db.commit()
+    finally:
+        db.close()
+
+
+def migrate_tour_departures(db: Session) -> int:
+    """Разовый перенос строковых Tour.dates в tour_departures (через run_once, коммитит вызывающий).
+
+    Уже существующие выезды не трогает (ON CONFLICT DO NOTHING), поэтому повторный
+    запуск безопасен.
+    """
+    created = 0
+    unparsed = 0
+    for tour in db.query(Tour).filter(Tour.dates.isnot(None)).all():
+        parsed = set()
+        for value in tour.dates:
+            departure_date = parse_departure_date(value)
+            if departure_date is None:
+                unparsed += 1
+                logger.warning("Не удалось разобрать дату выезда",
+                               extra={"fields": {"tour_id": tour.id, "value": value}})
+            else:
+                parsed.add(departure_date)
+        if not parsed:
+            continue
+        result = db.execute(
+            insert(TourDeparture)
+            .values([{"tour_id": tour.id, "date": departure_date} for departure_date in sorted(parsed)])
+            .on_conflict_do_nothing(index_elements=["tour_id", "date"])
+        )
+        created += result.rowcount
+    logger.info("Перенос дат выездов завершён", extra={"fields": {"created": created, "unparsed": unparsed}})
+    return created
+
+
+def run_migrations():
+    """Создание таблиц и изменения схемы; выполняется при старте каждого воркера и идемпотентно"""
+    # AUTOCOMMIT: CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        with migrations_lock(conn):
+            Base.metadata.create_all(bind=conn)
+            add_missing_columns(conn)
+            remove_duplicate_departures(conn)
+            create_missing_indexes(conn)
+            # Разовые переносы данных — после индексов: ON CONFLICT опирается на уникальный индекс
+            run_once("tour_departures_backfill", migrate_tour_departures)
+
+
+if __name__ == "__main__":
+    setup_logging()
+    run_migrations()
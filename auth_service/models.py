@@ -1,9 +1,13 @@
 from sqlalchemy.orm import relationship
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, Float, DateTime, ARRAY, func
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, Float, DateTime, Date, ARRAY, JSON, Index, DDL, event, func
 from database import Base
 import datetime
 
 
+# pg_trgm нужен для GIN-индексов поиска заявок по подстроке
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -35,8 +39,30 @@ class Tour(Base):
     created_at = Column(DateTime, default=func.now())
     category = Column(String, nullable=False)
     tags = Column(ARRAY(String), nullable=False)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     routes = relationship("Route", back_populates="tour", cascade="all, delete-orphan")
+    departures = relationship("TourDeparture", back_populates="tour", cascade="all, delete-orphan",
+                              order_by="TourDeparture.date")
+
+
+class TourDeparture(Base):
+    __tablename__ = "tour_departures"
+
+    id = Column(Integer, primary_key=True, index=True)
+    tour_id = Column(Integer, ForeignKey("tours.id", ondelete="CASCADE"), nullable=False, index=True)
+    date = Column(Date, nullable=False)
+    seats = Column(Integer, nullable=True)
+
+    tour = relationship("Tour", back_populates="departures")
+
+    # B-tree по (date, tour_id): выборка по диапазону дат идёт только по индексу.
+    # Уникальность (tour_id, date) сделана индексом, чтобы migrations.py мог добавить её
+    # в уже существующую таблицу; ON CONFLICT в переносе dates опирается на него.
+    __table_args__ = (
+        Index("ix_tour_departures_date_tour_id", "date", "tour_id"),
+        Index("uq_tour_departures_tour_id_date", "tour_id", "date", unique=True),
+    )
 
 
 class Route(Base):
@@ -103,3 +129,71 @@ class Application(Base):
     insurance_company_phone = Column(String, nullable=True)
     emergency_contact_phone = Column(String, nullable=True)
     created_at = Column(DateTime, default=func.now())
+
+    # Индексы для поиска заявок: триграммы для ILIKE по ФИО/e-mail, B-tree для дат и равенств
+    __table_args__ = (
+        Index("ix_applications_last_name_trgm", "last_name",
+              postgresql_using="gin", postgresql_ops={"last_name": "gin_trgm_ops"}),
+        Index("ix_applications_first_name_trgm", "first_name",
+              postgresql_using="gin", postgresql_ops={"first_name": "gin_trgm_ops"}),
+        Index("ix_applications_email_trgm", "email",
+              postgresql_using="gin", postgresql_ops={"email": "gin_trgm_ops"}),
+        # Термы короче трёх букв («Li», «Ng») триграммы не покрывают — их ищем по равенству lower()
+        Index("ix_applications_last_name_lower", func.lower(last_name)),
+        Index("ix_applications_first_name_lower", func.lower(first_name)),
+        Index("ix_applications_email_lower", func.lower(email)),
+        Index("ix_applications_passport_number", "passport_number"),
+        Index("ix_applications_package_type", "package_type"),
+        Index("ix_applications_arrival_date", "arrival_date"),
+        Index("ix_applications_departure_date", "departure_date"),
+        Index("ix_applications_created_at", "created_at"),
+    )
+
+
+class OutboxEvent(Base):
+    """Задача для фонового воркера, записывается в той же транзакции, что и основная сущность"""
+    __tablename__ = "outbox_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    event_type = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending / done / failed
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    available_at = Column(DateTime, nullable=False, default=func.now())
+    created_at = Column(DateTime, default=func.now())
+    processed_at = Column(DateTime, nullable=True)
+
+    # Воркер выбирает только готовые pending-задачи — частичный индекс остаётся маленьким
+    __table_args__ = (
+        Index("ix_outbox_events_pending", "available_at", "id",
+              postgresql_where=(status == "pending")),
+    )
+
+
+class CatalogChange(Base):
+    """Журнал изменений каталога: id служит Last-Event-ID для ленты /tours/changes"""
+    __tablename__ = "catalog_changes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    tour_id = Column(Integer, nullable=False)  # без FK: запись об удалении тура переживает сам тур
+    version = Column(Integer, nullable=False)
+    op = Column(String, nullable=False)  # create / update / delete
+    created_at = Column(DateTime, default=func.now(), index=True)
+
+
+class RateLimitBucket(Base):
+    """Общее для всех воркеров состояние token bucket (LOGIN_RATE_LIMIT_BACKEND=postgres)"""
+    __tablename__ = "rate_limit_buckets"
+
+    key = Column(String, primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(DateTime, nullable=False, default=func.now(), index=True)
+
+
+class SchemaMigration(Base):
+    """Отметки о выполненных разовых шагах миграции (migrations.run_once)"""
+    __tablename__ = "schema_migrations"
+
+    name = Column(String, primary_key=True)
+    applied_at = Column(DateTime, default=func.now())
@@ -0,0 +1,96 @@
+import os
+import logging
+import httpx
+from typing import Callable, Dict
+from sqlalchemy.orm import Session
+from models import OutboxEvent, Application
+
+# Задачи, которые ставятся после создания заявки (по одной строке outbox на задачу,
+# чтобы повтор одной не запускал заново остальные)
+APPLICATION_CREATED_EVENTS = (
+    "application.notify_staff",
+    "application.pdf_confirmation",
+    "application.crm_sync",
+)
+
+STAFF_WEBHOOK_URL = os.getenv("STAFF_WEBHOOK_URL")
+CRM_WEBHOOK_URL = os.getenv("CRM_WEBHOOK_URL")
+CONFIRMATIONS_DIR = os.getenv("CONFIRMATIONS_DIR", "confirmations")
+HTTP_TIMEOUT = float(os.getenv("OUTBOX_HTTP_TIMEOUT", "10"))
+
+Handler = Callable[[Session, dict], None]
+HANDLERS: Dict[str, Handler] = {}
+
+logger = logging.getLogger("outbox")
+
+
+def register_handler(event_type: str):
+    """Регистрирует обработчик для типа события (повторная регистрация заменяет прежний)"""
+    def decorator(func: Handler) -> Handler:
+        HANDLERS[event_type] = func
+        return func
+    return decorator
+
+
+def enqueue(db: Session, event_type: str, payload: dict) -> OutboxEvent:
+    """Добавляет событие в outbox; коммит делает вызывающий код вместе с основной записью"""
+    event = OutboxEvent(event_type=event_type, payload=payload)
+    db.add(event)
+    return event
+
+
+def enqueue_application_created(db: Session, application: Application):
+    for event_type in APPLICATION_CREATED_EVENTS:
+        enqueue(db, event_type, {"application_id": application.id})
+
+
+def _load_application(db: Session, payload: dict) -> Application:
+    application = db.query(Application).filter(Application.id == payload["application_id"]).first()
+    if not application:
+        raise LookupError(f"Application {payload['application_id']} not found")
+    return application
+
+
+def _application_summary(application: Application) -> dict:
+    return {
+        "id": application.id,
+        "name": f"{application.last_name} {application.first_name}",
+        "email": application.email,
+        "package_type": application.package_type,
+        "arrival_date": application.arrival_date.isoformat(),
+        "departure_date": application.departure_date.isoformat(),
+    }
+
+
+# ========================== ОБРАБОТЧИКИ ==========================
+# Без STAFF_WEBHOOK_URL / CRM_WEBHOOK_URL работают локальные заглушки — воркер
+# можно запускать и проверять без внешних сервисов.
+
+@register_handler("application.notify_staff")
+def notify_staff(db: Session, payload: dict):
+    summary = _application_summary(_load_application(db, payload))
+    if not STAFF_WEBHOOK_URL:
+        logger.info("Новая заявка (stub)", extra={"fields": {"application": summary}})
+        return
+    httpx.post(STAFF_WEBHOOK_URL, json={"event": "application.created", "application": summary},
+               timeout=HTTP_TIMEOUT).raise_for_status()
+
+
+@register_handler("application.pdf_confirmation")
+def render_pdf_confirmation(db: Session, payload: dict):
+    # Заглушка генератора: пишет текстовое подтверждение рядом с будущим PDF
+    summary = _application_summary(_load_application(db, payload))
+    os.makedirs(CONFIRMATIONS_DIR, exist_ok=True)
+    path = os.path.join(CONFIRMATIONS_DIR, f"application_{summary['id']}.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        for key, value in summary.items():
+            f.write(f"{key}: {value}\n")
+
+
+@register_handler("application.crm_sync")
+def sync_crm(db: Session, payload: dict):
+    summary = _application_summary(_load_application(db, payload))
+    if not CRM_WEBHOOK_URL:
+        logger.info("CRM sync (stub)", extra={"fields": {"application_id": summary["id"]}})
+        return
+    httpx.post(CRM_WEBHOOK_URL, json=summary, timeout=HTTP_TIMEOUT).raise_for_status()
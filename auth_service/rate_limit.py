@@ -0,0 +1,177 @@
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from fastapi import HTTPException, Request
+from sqlalchemy import text
+from database import SessionLocal
+
+# Лимиты попыток входа/регистрации: скорость пополнения (в минуту) и размер корзины
+IP_RATE_PER_MINUTE = float(os.getenv("LOGIN_RATE_PER_MINUTE_IP", "20"))
+IP_BURST = int(os.getenv("LOGIN_BURST_IP", "10"))
+EMAIL_RATE_PER_MINUTE = float(os.getenv("LOGIN_RATE_PER_MINUTE_EMAIL", "5"))
+EMAIL_BURST = int(os.getenv("LOGIN_BURST_EMAIL", "5"))
+# memory — счётчики своего процесса; postgres — общие для всех воркеров (таблица rate_limit_buckets)
+BACKEND = os.getenv("LOGIN_RATE_LIMIT_BACKEND", "memory")
+# Брать IP из X-Forwarded-For (только за доверенным прокси)
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "false").lower() == "true"
+# Сколько доверенных прокси стоит перед приложением: каждый дописывает адрес справа,
+# поэтому адрес клиента — N-й элемент с конца; всё левее мог подставить сам клиент
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "1"))
+MAX_TRACKED_KEYS = 100_000
+# Postgres-бэкенд удаляет устаревшие корзины примерно раз в PRUNE_EVERY проверок
+PRUNE_EVERY = int(os.getenv("LOGIN_RATE_LIMIT_PRUNE_EVERY", "500"))
+
+
+class TokenBucketLimiter:
+    """Token bucket в памяти процесса с вытеснением давно неиспользуемых ключей"""
+
+    def __init__(self, rate_per_minute: float, burst: int, max_keys: int = MAX_TRACKED_KEYS):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key: str) -> Tuple[bool, float]:
+        """Списывает токен; возвращает (разрешено, через сколько секунд появится следующий токен)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (float(self.burst), now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / self.rate
+
+
+class PostgresTokenBucketLimiter:
+    """Тот же алгоритм, но состояние в PostgreSQL — один атомарный UPSERT на проверку"""
+
+    def __init__(self, rate_per_minute: float, burst: int, key_prefix: str):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.key_prefix = key_prefix
+        # За это время пустая корзина заполняется целиком — старая строка ничем не отличается от новой
+        self.full_refill_seconds = burst / self.rate
+
+    def allow(self, key: str) -> Tuple[bool, float]:
+        # При отказе строка не меняется: пополнение продолжает считаться от последнего списания
+        refill = ("LEAST(:burst, rate_limit_buckets.tokens"
+                  " + EXTRACT(EPOCH FROM now() - rate_limit_buckets.updated_at) * :rate)")
+        db = SessionLocal()
+        try:
+            allowed, available = db.execute(text(f"""
+                INSERT INTO rate_limit_buckets (key, tokens, updated_at)
+                VALUES (:key, :burst - 1, now())
+                ON CONFLICT (key) DO UPDATE SET
+                    tokens = CASE WHEN {refill} >= 1 THEN {refill} - 1 ELSE rate_limit_buckets.tokens END,
+                    updated_at = CASE WHEN {refill} >= 1 THEN now() ELSE rate_limit_buckets.updated_at END
+                RETURNING updated_at = now(),
+                          tokens + EXTRACT(EPOCH FROM now() - updated_at) * :rate
+            """), {"key": key, "burst": self.burst, "rate": self.rate}).one()
+            if random.randrange(PRUNE_EVERY) == 0:
+                self._prune(db)
+            db.commit()
+        finally:
+            db.close()
+        return allowed, 0.0 if allowed else (1 - available) / self.rate
+
+    def _prune(self, db):
+        """Удаляет корзины этого лимитера, которые успели пополниться до конца"""
+        db.execute(text("""
+            DELETE FROM rate_limit_buckets
+            WHERE key LIKE :prefix AND updated_at < now() - make_interval(secs => :seconds)
+        """), {"prefix": f"{self.key_prefix}%", "seconds": self.full_refill_seconds})
+
+
+def _make_limiter(rate_per_minute: float, burst: int, key_prefix: str):
+    if BACKEND == "postgres":
+        return PostgresTokenBucketLimiter(rate_per_minute, burst, key_prefix)
+    return TokenBucketLimiter(rate_per_minute, burst)
+
+
+ip_limiter = _make_limiter(IP_RATE_PER_MINUTE, IP_BURST, "ip:")
+email_limiter = _make_limiter(EMAIL_RATE_PER_MINUTE, EMAIL_BURST, "email:")
+
+
+class LoginMetrics:
+    """Счётчики пропущенных/отклонённых попыток и оценка сэкономленного CPU на bcrypt"""
+
+    def __init__(self):
+        self.admitted = 0
+        self.rejected = 0
+        self.hash_cpu_seconds = 0.0
+        self.hash_count = 0
+        self._lock = threading.Lock()
+
+    def record_admitted(self):
+        with self._lock:
+            self.admitted += 1
+
+    def record_rejected(self):
+        with self._lock:
+            self.rejected += 1
+
+    def record_hash(self, cpu_seconds: float):
+        with self._lock:
+            self.hash_cpu_seconds += cpu_seconds
+            self.hash_count += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            avg_hash = self.hash_cpu_seconds / self.hash_count if self.hash_count else 0.0
+            return {
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "avg_hash_cpu_seconds": round(avg_hash, 6),
+                "cpu_seconds_saved": round(avg_hash * self.rejected, 3),
+            }
+
+
+metrics = LoginMetrics()
+
+
+def client_ip(request: Request) -> str:
+    if TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            hops = [value.strip() for value in forwarded.split(",")]
+            if 0 < TRUSTED_PROXY_HOPS <= len(hops):
+                return hops[-TRUSTED_PROXY_HOPS]
+    return request.client.host if request.client else "unknown"
+
+
+def _reject(retry_after: float):
+    metrics.record_rejected()
+    raise HTTPException(status_code=429, detail="Too many attempts, try again later",
+                        headers={"Retry-After": str(max(1, int(retry_after + 0.999)))})
+
+
+def check_ip_rate_limit(request: Request):
+    allowed, retry_after = ip_limiter.allow(f"ip:{client_ip(request)}")
+    if not allowed:
+        _reject(retry_after)
+
+
+def check_email_rate_limit(email: Optional[str]):
+    """Вызывается после разбора тела, но до запроса в БД и bcrypt"""
+    if email:
+        allowed, retry_after = email_limiter.allow(f"email:{email.strip().lower()}")
+        if not allowed:
+            _reject(retry_after)
+    metrics.record_admitted()
+
+
+def timed_hash(func, *args):
+    """Выполняет bcrypt-функцию и учитывает затраченное процессорное время"""
+    started = time.thread_time()
+    try:
+        return func(*args)
+    finally:
+        metrics.record_hash(time.thread_time() - started)
@@ -1,15 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException, Response, Request, status
+from fastapi import APIRouter, Depends, HTTPException, Response, Request, Query, Header, UploadFile, File, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, FileResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_, func, cast, Date
+from sqlalchemy.orm import Session, selectinload, joinedload
 from database import SessionLocal
-from models import User, Tour, Route, Schedule, Application
-from utils import hash_password, verify_password, create_access_token, create_refresh_token, decode_token
+from models import User, Tour, TourDeparture, Route, Schedule, Application
+from utils import hash_password, verify_password, create_access_token, create_refresh_token, decode_token, \
+    parse_departure_date
 from schemas import TourCreate, TourResponse, RouteCreate, RouteResponse, ScheduleCreate, ScheduleResponse, \
-    ApplicationCreate, ApplicationResponse, UserResponse
-from typing import List
+    ApplicationCreate, ApplicationResponse, UserResponse, ApplicationSearchResponse, ApplicationStats, \
+    ScheduleBatchRequest, ScheduleBatchResponse
+from outbox import enqueue_application_created
+from rate_limit import check_ip_rate_limit, check_email_rate_limit, timed_hash, metrics as login_metrics
+from media import save_schedule_image, resolve_media_path, MAX_UPLOAD_BYTES
+from catalog_events import broker, record_catalog_change, load_changes_since, format_sse, format_reset_sse
+from typing import List, Optional
+from datetime import date, datetime
+import asyncio
+import os
 
 router = APIRouter()
 
+SSE_HEARTBEAT_SECONDS = 15
+SSE_RETRY_MS = 3000
+
+# Если задан (например, "/protected-media/schedules"), файлы отдаёт nginx через X-Accel-Redirect + sendfile
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv("MEDIA_ACCEL_REDIRECT_PREFIX")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+FALLBACK_CACHE_CONTROL = "public, max-age=60"
+# Короче этого триграммный индекс не работает: такие термы ищутся по точному совпадению без учёта регистра
+TRIGRAM_MIN_LENGTH = 3
+
 
 # Получение сессии БД
 def get_db():
@@ -58,7 +80,7 @@ def generate_tokens(response: Response, user: User, db: Session):
 
 
 # Регистрация (для администраторов)
-@router.post("/register", status_code=status.HTTP_201_CREATED)
+@router.post("/register", status_code=status.HTTP_201_CREATED, dependencies=[Depends(check_ip_rate_limit)])
 async def register(request: Request, db: Session = Depends(get_db)):
     body = await request.json()  # Добавляем await
     email = body.get("email")
@@ -67,10 +89,11 @@ async def register(request: Request, db: Session = Depends(get_db)):
     if not email or not password:
         raise HTTPException(status_code=400, detail="Email and password are required")
 
+    await run_in_threadpool(check_email_rate_limit, email)
     if db.query(User).filter(User.email == email).first():
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    new_user = User(email=email, hashed_password=hash_password(password))
+    new_user = User(email=email, hashed_password=timed_hash(hash_password, password))
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
@@ -79,7 +102,7 @@ async def register(request: Request, db: Session = Depends(get_db)):
 
 
 # Авторизация (для администраторов)
-@router.post("/login_me")
+@router.post("/login_me", dependencies=[Depends(check_ip_rate_limit)])
 async def login(request: Request, response: Response, db: Session = Depends(get_db)):
     body = await request.json()  # Добавляем await
     email = body.get("email")
@@ -88,8 +111,10 @@ async def login(request: Request, response: Response, db: Session = Depends(get_
     if not email or not password:
         raise HTTPException(status_code=400, detail="Email and password are required")
 
+    # Лимит проверяется до запроса в БД и bcrypt — отклонённая попытка почти не стоит CPU
+    await run_in_threadpool(check_email_rate_limit, email)
     db_user = db.query(User).filter(User.email == email).first()
-    if not db_user or not verify_password(password, db_user.hashed_password):
+    if not db_user or not timed_hash(verify_password, password, db_user.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     return generate_tokens(response, db_user, db)
@@ -130,6 +155,12 @@ async def logout(response: Response, request: Request, db: Session = Depends(get
     return {"message": "Logged out successfully"}
 
 
+# Метрики ограничения попыток входа
+@router.get("/metrics/login")
+def get_login_metrics():
+    return login_metrics.snapshot()
+
+
 # Получение списка пользователей
 @router.get("/users/", response_model=List[UserResponse])
 def get_users(db: Session = Depends(get_db), ):
@@ -139,6 +170,34 @@ def get_users(db: Session = Depends(get_db), ):
 
 # ========================== ТУРЫ ==========================
 
+# Выезды тура: явный список departures либо разобранные строки dates.
+# Существующие строки совпадающих дат переиспользуются, поэтому места (seats)
+# не теряются, если клиент прислал только dates.
+def build_departures(tour_data: TourCreate, existing: List[TourDeparture] = ()) -> List[TourDeparture]:
+    by_date = {departure.date: departure for departure in existing}
+
+    if tour_data.departures is not None:
+        wanted = {d.date: d.seats for d in tour_data.departures}
+    else:
+        parsed = {parse_departure_date(value) for value in tour_data.dates or []}
+        parsed.discard(None)
+        wanted = {d: by_date[d].seats if d in by_date else None for d in parsed}
+
+    departures = []
+    for departure_date in sorted(wanted):
+        departure = by_date.get(departure_date) or TourDeparture(date=departure_date)
+        departure.seats = wanted[departure_date]
+        departures.append(departure)
+    return departures
+
+
+# Если клиент прислал departures, строки dates выводятся из них — иначе два поля могли бы разойтись
+def build_dates(tour_data: TourCreate) -> Optional[List[str]]:
+    if tour_data.departures is not None:
+        return [d.isoformat() for d in sorted({d.date for d in tour_data.departures})]
+    return tour_data.dates
+
+
 @router.post("/tours/", response_model=TourResponse)
 def create_tour(tour_data: TourCreate, db: Session = Depends(get_db)):
     new_tour = Tour(
@@ -146,7 +205,7 @@ def create_tour(tour_data: TourCreate, db: Session = Depends(get_db)):
         name_en=tour_data.name_en,
         countries=tour_data.countries,
         duration=tour_data.duration,
-        dates=tour_data.dates,
+        dates=build_dates(tour_data),
         description_ru=tour_data.description_ru,
         description_en=tour_data.description_en,
         meals_ru=tour_data.meals_ru,
@@ -157,7 +216,8 @@ def create_tour(tour_data: TourCreate, db: Session = Depends(get_db)):
         accommodation_ru=tour_data.accommodation_ru,
         accommodation_en=tour_data.accommodation_en,
         category=tour_data.category,
-        tags=tour_data.tags
+        tags=tour_data.tags,
+        departures=build_departures(tour_data)
     )
     db.add(new_tour)
     db.commit()
@@ -183,14 +243,87 @@ def create_tour(tour_data: TourCreate, db: Session = Depends(get_db)):
                 image=schedule_data.image
             )
             db.add(new_schedule)
+    record_catalog_change(db, new_tour, "create")
     db.commit()
 
     return new_tour
 
 
 @router.get("/tours/", response_model=List[TourResponse])
-def get_all_tours(db: Session = Depends(get_db)):
-    return db.query(Tour).all()
+def get_all_tours(ids: Optional[List[int]] = Query(None, description="Вернуть только туры с этими id"),
+                  db: Session = Depends(get_db)):
+    # Маршруты, расписание и выезды — по одному запросу на уровень вместо N+1
+    query = db.query(Tour).options(
+        selectinload(Tour.routes).selectinload(Route.schedules),
+        selectinload(Tour.departures),
+    )
+    if ids:
+        query = query.filter(Tour.id.in_(ids))
+    return query.order_by(Tour.id).all()
+
+
+@router.get("/tours/changes")
+async def stream_tour_changes(request: Request, last_event_id: Optional[str] = Header(None)):
+    """SSE-лента изменений каталога (tour_id, version, op) вместо опроса GET /tours/.
+
+    Событие reset означает, что догнать по журналу нельзя: клиент перечитывает GET /tours/.
+    """
+    try:
+        resume_from = int(last_event_id) if last_event_id else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+
+    async def event_stream():
+        # Подписываемся до чтения журнала, чтобы не потерять события между догонкой и live-потоком
+        queue = broker.subscribe()
+        replayed_ids = set()
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            if resume_from is not None:
+                changes, reset_to = await run_in_threadpool(load_changes_since, resume_from)
+                if reset_to is not None:
+                    yield format_reset_sse(reset_to)
+                for change in changes:
+                    replayed_ids.add(change["id"])
+                    yield format_sse(change)
+
+            while not await request.is_disconnected():
+                try:
+                    change = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if "reset_to" in change:
+                    yield format_reset_sse(change["reset_to"])
+                    continue
+                # Транзакции коммитятся не в порядке id, поэтому отсеиваем только уже отданные при догонке
+                if change["id"] in replayed_ids:
+                    continue
+                yield format_sse(change)
+        finally:
+            broker.unsubscribe(queue)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get("/tours/departures", response_model=List[TourResponse])
+def get_tours_by_departure(date_from: date = Query(..., alias="from"), date_to: date = Query(..., alias="to"),
+                           db: Session = Depends(get_db)):
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="'from' must not be later than 'to'")
+
+    # EXISTS по ix_tour_departures_date_tour_id, маршруты и расписание подгружаются пакетно
+    return (
+        db.query(Tour)
+        .filter(Tour.departures.any(and_(TourDeparture.date >= date_from, TourDeparture.date <= date_to)))
+        .options(
+            selectinload(Tour.routes).selectinload(Route.schedules),
+            selectinload(Tour.departures),
+        )
+        .order_by(Tour.id)
+        .all()
+    )
 
 
 @router.get("/tours/{tour_id}", response_model=TourResponse)
@@ -207,6 +340,7 @@ def delete_tour(tour_id: int, db: Session = Depends(get_db)):
     if not tour:
         raise HTTPException(status_code=404, detail="Tour not found")
 
+    record_catalog_change(db, tour, "delete")
     db.delete(tour)
     db.commit()
     return {"message": "Tour deleted successfully"}
@@ -223,7 +357,7 @@ def update_tour(tour_id: int, tour_data: TourCreate, db: Session = Depends(get_d
     tour.name_en = tour_data.name_en
     tour.countries = tour_data.countries
     tour.duration = tour_data.duration
-    tour.dates = tour_data.dates
+    tour.dates = build_dates(tour_data)
     tour.description_ru = tour_data.description_ru
     tour.description_en = tour_data.description_en
     tour.meals_ru = tour_data.meals_ru
@@ -235,6 +369,7 @@ def update_tour(tour_id: int, tour_data: TourCreate, db: Session = Depends(get_d
     tour.accommodation_en = tour_data.accommodation_en
     tour.category = tour_data.category
     tour.tags = tour_data.tags
+    tour.departures = build_departures(tour_data, tour.departures)
     db.commit()
 
     db.query(Route).filter(Route.tour_id == tour_id).delete()
@@ -260,6 +395,7 @@ def update_tour(tour_id: int, tour_data: TourCreate, db: Session = Depends(get_d
                 image=schedule_data.image
             )
             db.add(new_schedule)
+    record_catalog_change(db, tour, "update")
     db.commit()
 
     return tour
@@ -269,7 +405,8 @@ def update_tour(tour_id: int, tour_data: TourCreate, db: Session = Depends(get_d
 
 @router.post("/routes/{tour_id}", response_model=RouteResponse)
 def create_route(tour_id: int, route_data: RouteCreate, db: Session = Depends(get_db)):
-    if not db.query(Tour).filter(Tour.id == tour_id).first():
+    tour = db.query(Tour).filter(Tour.id == tour_id).first()
+    if not tour:
         raise HTTPException(status_code=404, detail="Tour not found")
 
     new_route = Route(
@@ -291,6 +428,7 @@ def create_route(tour_id: int, route_data: RouteCreate, db: Session = Depends(ge
             image=schedule_data.image
         )
         db.add(new_schedule)
+    record_catalog_change(db, tour, "update")
     db.commit()
 
     return new_route
@@ -319,6 +457,7 @@ def update_route(route_id: int, route_data: RouteCreate, db: Session = Depends(g
             image=schedule_data.image
         )
         db.add(new_schedule)
+    record_catalog_change(db, route.tour, "update")
     db.commit()
 
     return route
@@ -330,6 +469,7 @@ def delete_route(route_id: int, db: Session = Depends(get_db), ):
     if not route:
         raise HTTPException(status_code=404, detail="Route not found")
 
+    record_catalog_change(db, route.tour, "update")
     db.delete(route)
     db.commit()
     return {"message": "Route deleted successfully"}
@@ -342,10 +482,123 @@ def get_routes(tour_id: int, db: Session = Depends(get_db)):
 
 # ========================== РАСПИСАНИЕ ==========================
 
+@router.get("/schedules/", response_model=List[ScheduleResponse])
+def get_schedules_batch(route_ids: List[int] = Query(..., description="ID маршрутов"),
+                        db: Session = Depends(get_db)):
+    return (
+        db.query(Schedule)
+        .filter(Schedule.route_id.in_(route_ids))
+        .order_by(Schedule.route_id, Schedule.day_number, Schedule.id)
+        .all()
+    )
+
+
+@router.post("/schedules/batch", response_model=ScheduleBatchResponse)
+def batch_schedules(batch: ScheduleBatchRequest, db: Session = Depends(get_db)):
+    """Применяет список операций над днями расписания в одной транзакции (всё или ничего)"""
+    operations = batch.operations
+    schedule_ids = {op.id for op in operations if op.id is not None}
+    route_ids = {op.route_id for op in operations if op.route_id is not None}
+
+    # Все затронутые дни и маршруты (вместе с турами) — двумя запросами
+    schedules = {
+        schedule.id: schedule
+        for schedule in db.query(Schedule)
+        .options(joinedload(Schedule.route).joinedload(Route.tour))
+        .filter(Schedule.id.in_(schedule_ids))
+    } if schedule_ids else {}
+    routes = {
+        route.id: route
+        for route in db.query(Route).options(joinedload(Route.tour)).filter(Route.id.in_(route_ids))
+    } if route_ids else {}
+
+    errors = []
+    touched = []  # (index, op, Schedule | None)
+    tours = {}
+    deleted_ids = set()
+    for index, operation in enumerate(operations):
+        if operation.op == "create":
+            route = routes.get(operation.route_id)
+            if operation.data is None or route is None:
+                errors.append({"index": index, "detail": "Route not found" if operation.data else "data is required"})
+                continue
+            schedule = Schedule(
+                route_id=route.id,
+                day_number=operation.data.day_number,
+                activities_ru=operation.data.activities_ru,
+                activities_en=operation.data.activities_en,
+                image=operation.data.image
+            )
+            db.add(schedule)
+            tours[route.tour.id] = route.tour
+            touched.append((index, operation.op, schedule))
+            continue
+
+        schedule = schedules.get(operation.id)
+        if schedule is None or operation.id in deleted_ids:
+            errors.append({"index": index, "detail": "Schedule not found"})
+            continue
+        tours[schedule.route.tour.id] = schedule.route.tour
+
+        if operation.op == "update":
+            if operation.data is None:
+                errors.append({"index": index, "detail": "data is required"})
+                continue
+            schedule.day_number = operation.data.day_number
+            schedule.activities_ru = operation.data.activities_ru
+            schedule.activities_en = operation.data.activities_en
+            schedule.image = operation.data.image
+            touched.append((index, operation.op, schedule))
+        elif operation.op == "reorder":
+            if operation.day_number is None:
+                errors.append({"index": index, "detail": "day_number is required"})
+                continue
+            schedule.day_number = operation.day_number
+            touched.append((index, operation.op, schedule))
+        else:
+            db.delete(schedule)
+            deleted_ids.add(schedule.id)
+            touched.append((index, operation.op, None))
+
+    if errors:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=errors)
+
+    # День, удалённый дальше в той же пачке, не возвращаем и в результатах его предыдущих update/reorder
+    touched = [(index, op, None if schedule is not None and schedule.id in deleted_ids else schedule)
+               for index, op, schedule in touched]
+
+    for tour in tours.values():
+        record_catalog_change(db, tour, "update")
+    db.flush()
+    # id читаем до коммита: после него все экземпляры (включая первичный ключ) просрочены
+    result_ids = [
+        schedule.id if schedule is not None else operations[index].id
+        for index, _, schedule in touched
+    ]
+    db.commit()
+
+    # Один запрос вместо db.refresh() на каждый изменённый день
+    kept_ids = [schedule_id for (_, _, schedule), schedule_id in zip(touched, result_ids) if schedule is not None]
+    if kept_ids:
+        db.query(Schedule).filter(Schedule.id.in_(kept_ids)).all()
+
+    results = []
+    for (index, op, schedule), schedule_id in zip(touched, result_ids):
+        results.append({
+            "index": index,
+            "op": op,
+            "id": schedule_id,
+            "schedule": schedule,
+        })
+    return {"results": results}
+
+
 @router.post("/schedules/{route_id}", response_model=ScheduleResponse)
 def create_schedule(route_id: int, schedule_data: ScheduleCreate, db: Session = Depends(get_db),
                     ):
-    if not db.query(Route).filter(Route.id == route_id).first():
+    route = db.query(Route).filter(Route.id == route_id).first()
+    if not route:
         raise HTTPException(status_code=404, detail="Route not found")
 
     new_schedule = Schedule(
@@ -356,6 +609,7 @@ def create_schedule(route_id: int, schedule_data: ScheduleCreate, db: Session =
         image=schedule_data.image
     )
     db.add(new_schedule)
+    record_catalog_change(db, route.tour, "update")
     db.commit()
     db.refresh(new_schedule)
     return new_schedule
@@ -377,18 +631,54 @@ def update_schedule(schedule_id: int, schedule_data: ScheduleCreate, db: Session
     schedule.activities_ru = schedule_data.activities_ru
     schedule.activities_en = schedule_data.activities_en
     schedule.image = schedule_data.image
+    record_catalog_change(db, schedule.route.tour, "update")
     db.commit()
     db.refresh(schedule)
 
     return schedule
 
 
+@router.post("/schedules/{schedule_id}/image", response_model=ScheduleResponse)
+def upload_schedule_image(schedule_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)):
+    schedule = db.query(Schedule).filter(Schedule.id == schedule_id).first()
+    if not schedule:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+
+    data = file.file.read(MAX_UPLOAD_BYTES + 1)
+    try:
+        schedule.image = save_schedule_image(data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    record_catalog_change(db, schedule.route.tour, "update")
+    db.commit()
+    db.refresh(schedule)
+    return schedule
+
+
+@router.get("/media/schedules/{name}")
+def get_schedule_image(name: str):
+    resolved = resolve_media_path(name)
+    if not resolved:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    path, exact = resolved
+    # Имя файла — хеш содержимого, поэтому точное попадание можно кешировать навсегда
+    headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL if exact else FALLBACK_CACHE_CONTROL}
+    if MEDIA_ACCEL_REDIRECT_PREFIX:
+        headers["X-Accel-Redirect"] = f"{MEDIA_ACCEL_REDIRECT_PREFIX}/{os.path.basename(path)}"
+        return Response(headers=headers)
+    # FileResponse отдаёт файл через расширение http.response.pathsend, если сервер его поддерживает
+    return FileResponse(path, headers=headers)
+
+
 @router.delete("/schedules/{schedule_id}")
 def delete_schedule(schedule_id: int, db: Session = Depends(get_db), ):
     schedule = db.query(Schedule).filter(Schedule.id == schedule_id).first()
     if not schedule:
         raise HTTPException(status_code=404, detail="Schedule not found")
 
+    record_catalog_change(db, schedule.route.tour, "update")
     db.delete(schedule)
     db.commit()
     return {"message": "Schedule deleted successfully"}
@@ -436,6 +726,9 @@ def create_application(application_data: ApplicationCreate, db: Session = Depend
     )
 
     db.add(new_application)
+    db.flush()
+    # Уведомления, PDF и CRM выполняет worker.py — здесь только запись в outbox в той же транзакции
+    enqueue_application_created(db, new_application)
     db.commit()
     db.refresh(new_application)
     return new_application
@@ -446,6 +739,95 @@ def get_applications(db: Session = Depends(get_db)):
     return db.query(Application).all()
 
 
+def text_match(column, term: str):
+    if len(term) < TRIGRAM_MIN_LENGTH:
+        return func.lower(column) == term.lower()
+    # autoescape: % и _ в запросе ищутся буквально, а не как шаблон
+    return column.icontains(term, autoescape=True)
+
+
+@router.get("/applications/search", response_model=ApplicationSearchResponse)
+def search_applications(q: Optional[str] = Query(None, min_length=1, description="Фамилия, имя или e-mail"),
+                        last_name: Optional[str] = Query(None, min_length=1),
+                        email: Optional[str] = Query(None, min_length=1),
+                        passport_number: Optional[str] = None,
+                        package_type: Optional[str] = None,
+                        arrival_from: Optional[datetime] = None, arrival_to: Optional[datetime] = None,
+                        departure_from: Optional[datetime] = None, departure_to: Optional[datetime] = None,
+                        created_from: Optional[datetime] = None, created_to: Optional[datetime] = None,
+                        before_id: Optional[int] = Query(None, description="Курсор: id последней полученной заявки"),
+                        limit: int = Query(50, ge=1, le=200),
+                        db: Session = Depends(get_db)):
+    query = db.query(Application)
+
+    # ILIKE '%…%' обслуживается GIN-индексами gin_trgm_ops, короткие термы — индексами по lower()
+    if q:
+        query = query.filter(or_(text_match(Application.last_name, q),
+                                 text_match(Application.first_name, q),
+                                 text_match(Application.email, q)))
+    if last_name:
+        query = query.filter(text_match(Application.last_name, last_name))
+    if email:
+        query = query.filter(text_match(Application.email, email))
+    if passport_number:
+        query = query.filter(Application.passport_number == passport_number)
+    if package_type:
+        query = query.filter(Application.package_type == package_type)
+
+    for column, lower, upper in ((Application.arrival_date, arrival_from, arrival_to),
+                                 (Application.departure_date, departure_from, departure_to),
+                                 (Application.created_at, created_from, created_to)):
+        if lower is not None:
+            query = query.filter(column >= lower)
+        if upper is not None:
+            query = query.filter(column <= upper)
+
+    # Keyset-пагинация по первичному ключу вместо OFFSET
+    if before_id is not None:
+        query = query.filter(Application.id < before_id)
+
+    items = query.order_by(Application.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = items[-1].id
+
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.get("/applications/stats", response_model=ApplicationStats)
+def get_application_stats(arrival_from: Optional[datetime] = None, arrival_to: Optional[datetime] = None,
+                          db: Session = Depends(get_db)):
+    filters = []
+    if arrival_from is not None:
+        filters.append(Application.arrival_date >= arrival_from)
+    if arrival_to is not None:
+        filters.append(Application.arrival_date <= arrival_to)
+
+    # Агрегаты считает PostgreSQL, в Python приходят только готовые строки
+    by_package_type = (
+        db.query(Application.package_type, func.count(Application.id))
+        .filter(*filters)
+        .group_by(Application.package_type)
+        .order_by(func.count(Application.id).desc())
+        .all()
+    )
+
+    week = cast(func.date_trunc("week", Application.arrival_date), Date).label("week")
+    arrival_weeks = (
+        db.query(week, func.count(Application.id))
+        .filter(*filters)
+        .group_by(week)
+        .order_by(week)
+        .all()
+    )
+
+    return {
+        "by_package_type": [{"package_type": p, "count": c} for p, c in by_package_type],
+        "arrival_weeks": [{"week": w, "count": c} for w, c in arrival_weeks],
+    }
+
+
 @router.get("/applications/{application_id}", response_model=ApplicationResponse)
 def get_application(application_id: int, db: Session = Depends(get_db), ):
     application = db.query(Application).filter(Application.id == application_id).first()
@@ -1,6 +1,8 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, computed_field
+from typing import List, Optional, Literal
+import datetime as dt
 from datetime import datetime
+from media import image_variant_urls
 
 
 # Существующие схемы (оставляем без изменений)
@@ -18,6 +20,34 @@ class ScheduleCreate(ScheduleBase):
 class ScheduleResponse(ScheduleBase):
     id: int
 
+    @computed_field(description="Уменьшенные копии загруженного изображения (thumb, medium, original)")
+    @property
+    def image_variants(self) -> Optional[dict]:
+        return image_variant_urls(self.image)
+
+
+class ScheduleBatchOperation(BaseModel):
+    op: Literal["create", "update", "delete", "reorder"]
+    id: Optional[int] = Field(None, description="ID дня расписания (update / delete / reorder)")
+    route_id: Optional[int] = Field(None, description="ID маршрута (create)")
+    data: Optional[ScheduleCreate] = Field(None, description="Данные дня (create / update)")
+    day_number: Optional[int] = Field(None, ge=1, description="Новый номер дня (reorder)")
+
+
+class ScheduleBatchRequest(BaseModel):
+    operations: List[ScheduleBatchOperation] = Field(..., min_length=1, max_length=500)
+
+
+class ScheduleBatchResult(BaseModel):
+    index: int
+    op: str
+    id: Optional[int] = None
+    schedule: Optional[ScheduleResponse] = None
+
+
+class ScheduleBatchResponse(BaseModel):
+    results: List[ScheduleBatchResult]
+
 
 class RouteBase(BaseModel):
     cities: List[str] = Field(..., description="Список основных городов или достопримечательностей")
@@ -34,6 +64,18 @@ class RouteResponse(RouteBase):
     schedules: List[ScheduleResponse]
 
 
+class TourDepartureBase(BaseModel):
+    date: dt.date = Field(..., description="Дата выезда")
+    seats: Optional[int] = Field(None, ge=0, description="Количество свободных мест")
+
+
+class TourDepartureResponse(TourDepartureBase):
+    id: int
+
+    class Config:
+        from_attributes = True
+
+
 class TourBase(BaseModel):
     name_ru: str = Field(..., description="Название тура на русском")
     name_en: str = Field(..., description="Название тура на английском")
@@ -55,12 +97,15 @@ class TourBase(BaseModel):
 
 class TourCreate(TourBase):
     routes: List[RouteCreate]
+    departures: Optional[List[TourDepartureBase]] = Field(
+        None, description="Даты выезда с количеством мест; если заданы, dates выводится из них")
 
 
 class TourResponse(TourBase):
     id: int
     created_at: datetime
     routes: List[RouteResponse]
+    departures: List[TourDepartureResponse] = []
 
     class Config:
         from_attributes = True
@@ -116,6 +161,26 @@ class ApplicationResponse(ApplicationBase):
         from_attributes = True
 
 
+class ApplicationSearchResponse(BaseModel):
+    items: List[ApplicationResponse]
+    next_cursor: Optional[int] = Field(None, description="Передайте как before_id для следующей страницы")
+
+
+class PackageTypeCount(BaseModel):
+    package_type: str
+    count: int
+
+
+class ArrivalWeekCount(BaseModel):
+    week: dt.date = Field(..., description="Понедельник недели прибытия")
+    count: int
+
+
+class ApplicationStats(BaseModel):
+    by_package_type: List[PackageTypeCount]
+    arrival_weeks: List[ArrivalWeekCount]
+
+
 # Новая схема для пользователей
 class UserResponse(BaseModel):
     id: int
@@ -1,7 +1,7 @@
 import jwt
 import bcrypt
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,6 +11,22 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
+DEPARTURE_DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%y")
+
+
+def parse_departure_date(value: str) -> date | None:
+    """Разбирает дату выезда из свободной строки Tour.dates, None если формат неизвестен"""
+    value = (value or "").strip()
+    for fmt in DEPARTURE_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    try:
+        return datetime.fromisoformat(value).date()
+    except ValueError:
+        return None
+
 def hash_password(password: str) -> str:
     """Хеширует пароль с помощью bcrypt"""
     salt = bcrypt.gensalt()
@@ -0,0 +1,85 @@
+import os
+import time
+import logging
+from datetime import timedelta
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import OutboxEvent
+from outbox import HANDLERS
+from logging_config import setup_logging
+
+BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "2"))
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 3600
+
+logger = logging.getLogger("outbox.worker")
+
+
+def backoff_delay(attempts: int) -> timedelta:
+    """Экспоненциальная задержка перед повтором: 5с, 10с, 20с … не больше часа"""
+    return timedelta(seconds=min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS))
+
+
+def process_batch(db: Session) -> int:
+    """Забирает пачку готовых событий и обрабатывает их; возвращает размер пачки"""
+    # SKIP LOCKED: несколько воркеров разбирают очередь параллельно, не блокируя друг друга
+    events = (
+        db.query(OutboxEvent)
+        .filter(OutboxEvent.status == "pending", OutboxEvent.available_at <= func.now())
+        .order_by(OutboxEvent.available_at, OutboxEvent.id)
+        .limit(BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+    for event in events:
+        handler = HANDLERS.get(event.event_type)
+        event.attempts += 1
+        try:
+            if handler is None:
+                raise LookupError(f"No handler for event type '{event.event_type}'")
+            with db.begin_nested():
+                handler(db, event.payload)
+        except Exception as exc:
+            event.last_error = f"{type(exc).__name__}: {exc}"
+            logger.warning("Ошибка обработки события", extra={"fields": {
+                "event_id": event.id, "event_type": event.event_type,
+                "attempts": event.attempts, "error": event.last_error,
+            }})
+            if event.attempts >= MAX_ATTEMPTS:
+                event.status = "failed"
+            else:
+                event.available_at = func.now() + backoff_delay(event.attempts)
+        else:
+            event.status = "done"
+            event.last_error = None
+            event.processed_at = func.now()
+
+    db.commit()
+    return len(events)
+
+
+def run_worker():
+    setup_logging()
+    logger.info("Воркер запущен", extra={"fields": {"batch": BATCH_SIZE, "poll_interval": POLL_INTERVAL}})
+    while True:
+        db = SessionLocal()
+        try:
+            processed = process_batch(db)
+        except Exception:
+            db.rollback()
+            logger.exception("Ошибка обработки пачки")
+            processed = 0
+        finally:
+            db.close()
+
+        # Пока очередь не пуста — сразу берём следующую пачку
+        if processed < BATCH_SIZE:
+            time.sleep(POLL_INTERVAL)
+
+
+if __name__ == "__main__":
+    run_worker()